@@ -1,14 +1,36 @@
 import discord
-from discord.ext import tasks, commands
+from discord.ext import commands
 import os
 from datetime import datetime, timezone, timedelta
 from dotenv import load_dotenv
 import aiohttp
+import orjson
 import random
+import asyncio
+import logging
+import logging.handlers
+import queue
+from operator import attrgetter
+from dataclasses import dataclass
+from collections import OrderedDict
 
 # Load environment variables
 load_dotenv()
 
+log = logging.getLogger(__name__)
+
+def setup_logging(level=logging.INFO):
+    # Log records are queued on the event loop thread and written to stderr by a background listener
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)-8s %(name)s %(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener.start()
+    return listener
+
 # Discord bot setup
 intents = discord.Intents.default()
 intents.message_content = True  # Enable message content intent
@@ -32,52 +54,158 @@ COLLECTIONS = {
     # }
 }
 
-def load_last_sale_timestamp(collection):
+# Constant per-collection embed pieces
+for _name, _cfg in COLLECTIONS.items():
+    _cfg["_title_prefix"] = _name.capitalize() + " #"
+    _cfg["_footer_suffix"] = f" | {_cfg['hashtag']} ✅"
+
+# Shared timestamp sentinels: "never posted" watermark and the fallback for sales without a date
+_EPOCH_MIN = datetime.min.replace(tzinfo=timezone.utc)
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Sales older than this are never announced
+_24H = timedelta(hours=24)
+
+# Varied emojis for sale announcements
+_EMOJIS = ("🔥", "🚀", "💥", "🌟", "⚡")
+_rng = random.Random()
+
+# Adaptive polling: seconds between polls, doubled after consecutive empty polls
+_MIN_POLL_INTERVAL = 30
+_MAX_POLL_INTERVAL = 300
+_BACKOFF_AFTER_EMPTY_POLLS = 3
+_polling_task = None
+
+# Shared HTTP session, created in setup_hook so the connection to the API is kept alive between polls
+http_session = None
+
+# Validators and payload from the last 200 response per collection, used for conditional GETs
+_last_etag = {}
+_last_mod = {}
+_last_sales = {}
+
+# Bounded LRU of recently posted sales, guarding against double-posting sales that
+# share a timestamp across overlapping polls. Keyed on the sale rather than the
+# inscription alone so resales of the same NFT are still announced
+_SEEN_MAX = 128
+_seen = OrderedDict()
+
+def _sale_key(sale):
+    # Sales without an inscription ID can't be told apart, so they are never deduplicated
+    if not sale.inscription_id:
+        return None
+    return (sale.inscription_id, sale.ts, sale.buyer)
+
+def _mark_posted(sale):
+    key = _sale_key(sale)
+    if key is None:
+        return
+    _seen[key] = None
+    _seen.move_to_end(key)
+    if len(_seen) > _SEEN_MAX:
+        _seen.popitem(last=False)
+
+# In-memory copy of each collection's last sale timestamp; the files are only
+# written by this bot, so they are read once at startup and kept in sync on save
+_last_ts_cache = {}
+
+def _read_last_sale_timestamp(collection):
     file_path = COLLECTIONS[collection]["last_sale_timestamp_file"]
     if os.path.exists(file_path):
         with open(file_path, "r") as f:
             timestamp_str = f.read().strip()
             if timestamp_str:
                 return datetime.fromisoformat(timestamp_str.replace("Z", "+00:00"))
-    return datetime.min.replace(tzinfo=timezone.utc)
+    return _EPOCH_MIN
+
+def init_last_sale_timestamps():
+    for collection in COLLECTIONS:
+        _last_ts_cache[collection] = _read_last_sale_timestamp(collection)
+
+def load_last_sale_timestamp(collection):
+    return _last_ts_cache.get(collection, _EPOCH_MIN)
 
 def save_last_sale_timestamp(collection, timestamp):
     with open(COLLECTIONS[collection]["last_sale_timestamp_file"], "w") as f:
         f.write(timestamp.isoformat())
+    _last_ts_cache[collection] = timestamp
+
+def _parse_ts(value):
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+@dataclass
+class SaleRow:
+    # One order from the listings API, converted once at fetch time.
+    # __slots__ is declared by hand because dataclass(slots=True) needs Python 3.10
+    __slots__ = ("inscription_id", "ts", "status", "price", "seller", "buyer", "item", "ins_num")
+
+    inscription_id: str
+    ts: datetime
+    status: str
+    price: int
+    seller: str
+    buyer: str
+    item: str
+    ins_num: str
+
+    @classmethod
+    def from_api(cls, raw):
+        date = raw.get("date")
+        return cls(
+            inscription_id=raw.get("inscriptionId") or "",
+            ts=_parse_ts(date) if date else _EPOCH,
+            status=raw.get("status") or "",
+            price=raw.get("price") or 0,
+            seller=raw.get("sellerAddress") or "",
+            buyer=raw.get("buyerAddress") or "",
+            item=str(raw.get("itemId", "???")),
+            ins_num=str(raw.get("inscriptionNumber", "N/A"))
+        )
 
 async def fetch_sales(collection):
     api_url = COLLECTIONS[collection]["api_url"]
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{api_url}?type=sell&offset=0&limit=20", headers={}) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    print(f"Fetched {collection} sales data successfully")
-                    return data.get("data", [])
-                else:
-                    print(f"Error fetching {collection} sales: HTTP {response.status}, Response: {await response.text()}")
-                    return []
+        headers = {}
+        if collection in _last_etag:
+            headers["If-None-Match"] = _last_etag[collection]
+        if collection in _last_mod:
+            headers["If-Modified-Since"] = _last_mod[collection]
+        async with http_session.get(f"{api_url}?type=sell&offset=0&limit=20", headers=headers) as response:
+            if response.status == 304:
+                log.debug("%s sales data not modified", collection)
+                return _last_sales.get(collection, [])
+            if response.status == 200:
+                data = orjson.loads(await response.read())
+                log.debug("Fetched %s sales data successfully", collection)
+                sales = [SaleRow.from_api(raw) for raw in data.get("data", [])]
+                if "ETag" in response.headers:
+                    _last_etag[collection] = response.headers["ETag"]
+                if "Last-Modified" in response.headers:
+                    _last_mod[collection] = response.headers["Last-Modified"]
+                _last_sales[collection] = sales
+                return sales
+            else:
+                log.error("Error fetching %s sales: HTTP %s, Response: %s", collection, response.status, await response.text())
+                return []
     except Exception as e:
-        print(f"Error fetching {collection} sales: {e}")
+        log.error("Error fetching %s sales: %s", collection, e)
         return []
 
 def create_sale_message(collection):
-    # List of varied emojis for sale announcements
-    emojis = ["🔥", "🚀", "💥", "🌟", "⚡"]
-    emoji = random.choice(emojis)
-    return f"🐶 **{collection.upper()} ALERT! Fresh Sale on Doginals! {emoji}**"
+    return f"🐶 **{collection.upper()} ALERT! Fresh Sale on Doginals! {_rng.choice(_EMOJIS)}**"
 
 async def post_sale_to_discord(channel, collection, sale):
-    raw_price = sale.get("price", 0)
-    price_doge = raw_price / 100000000
-    sale_id = sale.get("inscriptionId", "")
-    sale_timestamp_str = sale.get("date", "1970-01-01T00:00:00.000Z")
-    sale_timestamp = datetime.fromisoformat(sale_timestamp_str.replace("Z", "+00:00"))
+    price_doge = sale.price / 100000000
+    sale_id = sale.inscription_id
+    sale_timestamp = sale.ts
 
     # Shorten addresses for privacy (first 4 + last 4 chars)
-    seller = sale.get("sellerAddress", "Myst")[:4] + "..." + sale.get("sellerAddress", "Myst")[-4:]
-    buyer = sale.get("buyerAddress", "NewP")[:4] + "..." + sale.get("buyerAddress", "NewP")[-4:]
+    seller_address = sale.seller or "Myst"
+    seller = f"{seller_address[:4]}...{seller_address[-4:]}"
+    buyer_address = sale.buyer or "NewP"
+    buyer = f"{buyer_address[:4]}...{buyer_address[-4:]}"
 
+    cfg = COLLECTIONS[collection]
     message = create_sale_message(collection)
 
     # Construct URLs
@@ -86,79 +214,130 @@ async def post_sale_to_discord(channel, collection, sale):
 
     # Create embed
     embed = discord.Embed(
-        title=f"{collection.capitalize()} #{sale.get('itemId', '???')}",
+        title=cfg["_title_prefix"] + sale.item,
         url=sale_url,
         description=message,
-        color=COLLECTIONS[collection]["color"]
+        color=cfg["color"]
     )
     embed.add_field(name="💰 Sold for", value=f"{price_doge:.2f} Doge", inline=True)
-    embed.add_field(name="Inscription Number", value=str(sale.get("inscriptionNumber", "N/A")), inline=True)
+    embed.add_field(name="Inscription Number", value=sale.ins_num, inline=True)
     embed.add_field(name="Buyer", value=buyer, inline=True)  # Same row
     embed.add_field(name="Seller", value=seller, inline=True)  # Same row
 
     embed.set_thumbnail(url=image_url)
-    embed.set_footer(text=f"Sold on {sale_timestamp.strftime('%Y-%m-%d %H:%M:%S UTC')} | {COLLECTIONS[collection]['hashtag']} ✅")
+    embed.set_footer(text="Sold on " + sale_timestamp.strftime("%Y-%m-%d %H:%M:%S UTC") + cfg["_footer_suffix"])
 
     await channel.send(embed=embed)
-    print(f"Posted sale for {collection}: itemId={sale.get('itemId')}, price={price_doge:.2f} DOGE")
+    log.info("Posted sale for %s: itemId=%s, price=%.2f DOGE", collection, sale.item, price_doge)
     return sale_timestamp
 
-@tasks.loop(seconds=60)
-async def check_sales():
-    for collection in COLLECTIONS:
-        channel = bot.get_channel(COLLECTIONS[collection]["channel_id"])
-        if not channel:
-            print(f"Error: Channel with ID {COLLECTIONS[collection]['channel_id']} not found or bot lacks permission for {collection}.")
-            continue
-
-        last_sale_timestamp = load_last_sale_timestamp(collection)
-        print(f"Current time: {datetime.now(timezone.utc)}, Last sale timestamp for {collection}: {last_sale_timestamp}")
-
-        sales = await fetch_sales(collection)
-        sales = sorted(sales, key=lambda x: datetime.fromisoformat(x.get("date", "1970-01-01T00:00:00.000Z").replace("Z", "+00:00")))
-
-        new_last_sale_timestamp = last_sale_timestamp
-        current_time = datetime.now(timezone.utc)
-
-        # Count skipped sales for summary
-        skipped_older = 0
-        skipped_processed = 0
-
-        for sale in sales:
-            if sale.get("status") != "bought" or not sale.get("buyerAddress"):
-                continue
+async def _process_collection(collection):
+    channel = COLLECTIONS[collection].get("channel")
+    if not channel:
+        log.error("Channel with ID %s not found or bot lacks permission for %s.", COLLECTIONS[collection]["channel_id"], collection)
+        return False
 
-            sale_timestamp_str = sale.get("date", "1970-01-01T00:00:00.000Z")
-            sale_timestamp = datetime.fromisoformat(sale_timestamp_str.replace("Z", "+00:00"))
+    sales = await fetch_sales(collection)
+    last_sale_timestamp = load_last_sale_timestamp(collection)
+    if not any(s.status == "bought" and s.ts > last_sale_timestamp for s in sales):
+        log.debug("No new sales to process for %s.", collection)
+        return False
+
+    current_time = datetime.now(timezone.utc)
+    log.debug("Current time: %s, Last sale timestamp for %s: %s", current_time, collection, last_sale_timestamp)
+
+    # Count skipped sales for summary
+    skipped_older = 0
+    skipped_processed = 0
+
+    pending = []
+    pending_keys = set()
+    for sale in sales:
+        if sale.status != "bought" or not sale.buyer:
+            continue
 
-            if current_time - sale_timestamp > timedelta(hours=24):
-                skipped_older += 1
-                continue
+        sale_timestamp = sale.ts
 
-            if sale_timestamp <= last_sale_timestamp:
-                skipped_processed += 1
-                continue
+        if current_time - sale_timestamp > _24H:
+            skipped_older += 1
+            continue
 
-            new_sale_timestamp = await post_sale_to_discord(channel, collection, sale)
-            if new_sale_timestamp > new_last_sale_timestamp:
-                new_last_sale_timestamp = new_sale_timestamp
+        sale_key = _sale_key(sale)
+        if sale_timestamp <= last_sale_timestamp or (sale_key is not None and (sale_key in _seen or sale_key in pending_keys)):
+            skipped_processed += 1
+            continue
 
-        # Log summary of skipped sales
-        if skipped_older > 0:
-            print(f"Skipped {skipped_older} sales for {collection}: older than 24 hours")
-        if skipped_processed > 0:
-            print(f"Skipped {skipped_processed} sales for {collection}: already processed")
+        pending.append(sale)
+        if sale_key is not None:
+            pending_keys.add(sale_key)
+
+    # Sort only the new sales, then post them one at a time so the channel reads
+    # oldest-first; discord.py handles rate limits
+    pending.sort(key=attrgetter("ts"))
+    new_last_sale_timestamp = last_sale_timestamp
+    for sale in pending:
+        new_sale_timestamp = await post_sale_to_discord(channel, collection, sale)
+        _mark_posted(sale)
+        if new_sale_timestamp > new_last_sale_timestamp:
+            new_last_sale_timestamp = new_sale_timestamp
+
+    # Log summary of skipped sales
+    if skipped_older > 0:
+        log.info("Skipped %d sales for %s: older than 24 hours", skipped_older, collection)
+    if skipped_processed > 0:
+        log.info("Skipped %d sales for %s: already processed", skipped_processed, collection)
+
+    if new_last_sale_timestamp != last_sale_timestamp:
+        save_last_sale_timestamp(collection, new_last_sale_timestamp)
+        log.info("Updated last_sale_timestamp for %s to: %s", collection, new_last_sale_timestamp)
+        return True
+    log.debug("No new sales to process for %s.", collection)
+    return False
 
-        if new_last_sale_timestamp != last_sale_timestamp:
-            save_last_sale_timestamp(collection, new_last_sale_timestamp)
-            print(f"Updated last_sale_timestamp for {collection} to: {new_last_sale_timestamp}")
+async def check_sales():
+    # Poll every collection once; returns True if any new sale was posted
+    results = await asyncio.gather(*(_process_collection(c) for c in COLLECTIONS), return_exceptions=True)
+    for collection, result in zip(COLLECTIONS, results):
+        if isinstance(result, Exception):
+            log.error("Error checking %s sales: %s", collection, result)
+    return any(result is True for result in results)
+
+async def _polling_loop():
+    # Back off while the market is quiet and snap back as soon as a sale appears
+    interval = _MIN_POLL_INTERVAL
+    empty_ticks = 0
+    while True:
+        try:
+            found_new = await check_sales()
+        except Exception:
+            log.exception("Error during sales poll")
+            found_new = False
+        if found_new:
+            interval = _MIN_POLL_INTERVAL
+            empty_ticks = 0
         else:
-            print(f"No new sales to process for {collection}.")
+            empty_ticks += 1
+            if empty_ticks >= _BACKOFF_AFTER_EMPTY_POLLS:
+                interval = min(_MAX_POLL_INTERVAL, interval * 2)
+        await asyncio.sleep(interval)
+
+@bot.event
+async def setup_hook():
+    global http_session
+    http_session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=10, ttl_dns_cache=300),
+        timeout=aiohttp.ClientTimeout(total=15)
+    )
 
 @bot.event
 async def on_ready():
-    print(f"Bot is ready as {bot.user}")
-    check_sales.start()
+    global _polling_task
+    log.info("Bot is ready as %s", bot.user)
+    init_last_sale_timestamps()
+    for cfg in COLLECTIONS.values():
+        cfg["channel"] = bot.get_channel(cfg["channel_id"])
+    if _polling_task is None or _polling_task.done():
+        _polling_task = asyncio.create_task(_polling_loop())
 
 @bot.command()
 async def post_last_sale(ctx, collection: str = "dopedoges"):
@@ -166,7 +345,7 @@ async def post_last_sale(ctx, collection: str = "dopedoges"):
         await ctx.send("Invalid collection. Use 'dopedoges' or 'minidoges'.")
         return
 
-    channel = bot.get_channel(COLLECTIONS[collection]["channel_id"])
+    channel = COLLECTIONS[collection].get("channel")
     if not channel:
         await ctx.send(f"Error: Channel not found or bot lacks permission for {collection}.")
         return
@@ -176,7 +355,7 @@ async def post_last_sale(ctx, collection: str = "dopedoges"):
         await ctx.send(f"No sales data available to post for {collection}.")
         return
 
-    sales = sorted(sales, key=lambda x: datetime.fromisoformat(x.get("date", "1970-01-01T00:00:00.000Z").replace("Z", "+00:00")), reverse=True)
+    sales = sorted(sales, key=attrgetter("ts"), reverse=True)
     last_sale = sales[0]
     await post_sale_to_discord(channel, collection, last_sale)
     await ctx.send(f"Last sale for {collection} posted to the sales channel!")
@@ -187,12 +366,12 @@ async def test_sale(ctx, collection: str = "dopedoges"):
         await ctx.send("Invalid collection. Use 'dopedoges' or 'minidoges'.")
         return
 
-    channel = bot.get_channel(COLLECTIONS[collection]["channel_id"])
+    channel = COLLECTIONS[collection].get("channel")
     if not channel:
         await ctx.send(f"Error: Channel not found or bot lacks permission for {collection}.")
         return
 
-    test_sale = {
+    test_sale = SaleRow.from_api({
         "inscriptionId": f"test_image_id_{collection}",
         "status": "bought",
         "price": 70000000000 if collection == "dopedoges" else 50000000000,
@@ -201,15 +380,34 @@ async def test_sale(ctx, collection: str = "dopedoges"):
         "itemId": "999" if collection == "dopedoges" else "888",
         "date": "2025-03-11T21:00:00.000Z",
         "inscriptionNumber": 12345 if collection == "dopedoges" else 54321
-    }
+    })
     message = create_sale_message(collection)
-    print(f"Test sale message for {collection}: {message}")
+    log.info("Test sale message for %s: %s", collection, message)
 
     await post_sale_to_discord(channel, collection, test_sale)
     await ctx.send(f"Test sale posted to the {collection} sales channel!")
 
+async def main(bot_token):
+    async with bot:
+        try:
+            await bot.start(bot_token)
+        finally:
+            if http_session is not None and not http_session.closed:
+                await http_session.close()
+
 if __name__ == "__main__":
     bot_token = os.getenv("DISCORD_BOT_TOKEN", "yourbottokenid")
     if not bot_token:
         raise ValueError("DISCORD_BOT_TOKEN not found in .env file")
-    bot.run(bot_token)
+    try:
+        import uvloop
+        run = uvloop.run
+    except ImportError:
+        run = asyncio.run
+    listener = setup_logging()
+    try:
+        run(main(bot_token))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.stop()